@@ -1,321 +1,731 @@
-from sqlalchemy import create_engine, inspect, text
-import json
+from sqlalchemy import create_engine
+import argparse
+import orjson
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from urllib.parse import quote_plus
 import os
+import sys
 from dotenv import load_dotenv
+from jinja2 import Environment
 
-# Load environment variables from .env.local
-load_dotenv('.env')
-
-# Get database credentials from environment variables
-db_password = quote_plus(os.getenv('DB_PASSWORD'))
-db_host = os.getenv('DB_HOST')
-db_port = os.getenv('DB_PORT')
-db_user = os.getenv('DB_USER')
-db_name = os.getenv('DB_NAME')
-
-# Construct database URL
-DATABASE_URL = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-
-# Create an SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
-
-# Create an inspector
-inspector = inspect(engine)
-
-# Initialize metadata dictionary
-database_metadata = {
-    "tables": [],
-    "foreign_keys": [],
-    "functions": [],
-    "triggers": [],
-    "enums": [],
-    "indexes": []
-}
-
-# Fetch Enumerated Types
-with engine.connect() as connection:
-    enum_query = text("""
-        SELECT 
-            t.typname as enum_name,
-            n.nspname as schema_name,
-            array_agg(e.enumlabel ORDER BY e.enumsortorder) as enum_values
-        FROM pg_type t
-        JOIN pg_enum e ON t.oid = e.enumtypid
-        JOIN pg_namespace n ON t.typnamespace = n.oid
-        WHERE n.nspname = 'public'
-        GROUP BY t.typname, n.nspname
-        ORDER BY t.typname;
-    """)
-    result = connection.execute(enum_query)
-    for enum_name, schema_name, enum_values in result.fetchall():
-        database_metadata["enums"].append({
+# Fingerprint of the last extracted catalog state, stored next to the outputs
+CACHE_FILE = ".schema_cache_version.json"
+OUTPUT_FILES = ("database_metadata.json", "database_schema.md")
+# Bump whenever a change to this script alters what ends up in the outputs,
+# so outputs written by an older version aren't kept as up to date
+OUTPUT_FORMAT_VERSION = 4
+
+# Catalog queries, all scoped to the schema list bound as %(schemas)s. They
+# are plain strings rather than text() since they run on the raw psycopg
+# connection, and are defined once here instead of on every call.
+
+# Besides everything in the listed schemas, the fingerprint covers objects
+# elsewhere that the output names: tables referred to by foreign keys, types
+# used by columns and functions, trigger functions, whatever pg_depend records
+# the rendered defaults, constraints and index definitions as referring to
+# (sequences, functions, types), and the schemas all of those live in
+FINGERPRINT_SQL = """
+    WITH ns AS (
+        SELECT oid FROM pg_namespace WHERE nspname = ANY(%(schemas)s::name[])
+    ),
+    base_rel AS (
+        SELECT c.oid FROM pg_class c WHERE c.relnamespace IN (SELECT oid FROM ns)
+        UNION
+        SELECT f.confrelid FROM pg_constraint f
+        WHERE f.contype = 'f' AND f.connamespace IN (SELECT oid FROM ns)
+    ),
+    deps AS (
+        SELECT d.refclassid, d.refobjid FROM pg_depend d
+        WHERE (d.classid = 'pg_attrdef'::regclass
+               AND d.objid IN (SELECT ad.oid FROM pg_attrdef ad WHERE ad.adrelid IN (SELECT oid FROM base_rel)))
+        OR (d.classid = 'pg_constraint'::regclass
+            AND d.objid IN (SELECT c.oid FROM pg_constraint c WHERE c.connamespace IN (SELECT oid FROM ns)))
+        OR (d.classid = 'pg_class'::regclass
+            AND d.objid IN (SELECT i.indexrelid FROM pg_index i WHERE i.indrelid IN (SELECT oid FROM base_rel)))
+    ),
+    rel AS (
+        SELECT oid FROM base_rel
+        UNION
+        SELECT refobjid FROM deps WHERE refclassid = 'pg_class'::regclass
+    ),
+    proc AS (
+        SELECT p.oid FROM pg_proc p WHERE p.pronamespace IN (SELECT oid FROM ns)
+        UNION
+        SELECT t.tgfoid FROM pg_trigger t WHERE t.tgrelid IN (SELECT oid FROM rel)
+        UNION
+        SELECT refobjid FROM deps WHERE refclassid = 'pg_proc'::regclass
+    ),
+    typ AS (
+        SELECT t.oid FROM pg_type t WHERE t.typnamespace IN (SELECT oid FROM ns)
+        UNION
+        SELECT a.atttypid FROM pg_attribute a WHERE a.attrelid IN (SELECT oid FROM rel)
+        UNION
+        SELECT refobjid FROM deps WHERE refclassid = 'pg_type'::regclass
+        UNION
+        SELECT p.prorettype FROM pg_proc p WHERE p.oid IN (SELECT oid FROM proc)
+        UNION
+        SELECT unnest(p.proargtypes::oid[]) FROM pg_proc p WHERE p.oid IN (SELECT oid FROM proc)
+        UNION
+        SELECT unnest(p.proallargtypes) FROM pg_proc p WHERE p.oid IN (SELECT oid FROM proc)
+    )
+    SELECT
+        (SELECT md5(coalesce(string_agg(n.oid::text || ':' || n.xmin::text, ',' ORDER BY n.oid), ''))
+         FROM pg_namespace n
+         WHERE n.oid IN (SELECT oid FROM ns)
+         OR n.oid IN (SELECT c.relnamespace FROM pg_class c WHERE c.oid IN (SELECT oid FROM rel))
+         OR n.oid IN (SELECT t.typnamespace FROM pg_type t WHERE t.oid IN (SELECT oid FROM typ))
+         OR n.oid IN (SELECT p.pronamespace FROM pg_proc p WHERE p.oid IN (SELECT oid FROM proc))) as namespaces,
+        (SELECT md5(coalesce(string_agg(c.oid::text || ':' || c.xmin::text, ',' ORDER BY c.oid), ''))
+         FROM pg_class c
+         WHERE c.oid IN (SELECT oid FROM rel)) as relations,
+        (SELECT md5(coalesce(string_agg(a.attrelid::text || '.' || a.attnum::text || ':' || a.xmin::text, ','
+                                        ORDER BY a.attrelid, a.attnum), ''))
+         FROM pg_attribute a
+         WHERE a.attrelid IN (SELECT oid FROM rel)) as columns,
+        (SELECT md5(coalesce(string_agg(d.oid::text || ':' || d.xmin::text, ',' ORDER BY d.oid), ''))
+         FROM pg_attrdef d
+         WHERE d.adrelid IN (SELECT oid FROM rel)) as defaults,
+        (SELECT md5(coalesce(string_agg(c.oid::text || ':' || c.xmin::text, ',' ORDER BY c.oid), ''))
+         FROM pg_constraint c
+         WHERE c.connamespace IN (SELECT oid FROM ns)) as constraints,
+        (SELECT md5(coalesce(string_agg(t.oid::text || ':' || t.xmin::text, ',' ORDER BY t.oid), ''))
+         FROM pg_trigger t
+         WHERE t.tgrelid IN (SELECT oid FROM rel)) as triggers,
+        (SELECT md5(coalesce(string_agg(p.oid::text || ':' || p.xmin::text, ',' ORDER BY p.oid), ''))
+         FROM pg_proc p
+         WHERE p.oid IN (SELECT oid FROM proc)) as functions,
+        (SELECT md5(coalesce(string_agg(t.oid::text || ':' || t.xmin::text, ',' ORDER BY t.oid), ''))
+         FROM pg_type t
+         WHERE t.oid IN (SELECT oid FROM typ)) as types,
+        (SELECT md5(coalesce(string_agg(e.oid::text || ':' || e.xmin::text, ',' ORDER BY e.oid), ''))
+         FROM pg_enum e
+         WHERE e.enumtypid IN (SELECT oid FROM typ)) as enums;
+"""
+
+ENUM_SQL = """
+    SELECT
+        t.typname as enum_name,
+        n.nspname as schema_name,
+        array_agg(e.enumlabel ORDER BY e.enumsortorder) as enum_values
+    FROM pg_type t
+    JOIN pg_enum e ON t.oid = e.enumtypid
+    JOIN pg_namespace n ON t.typnamespace = n.oid
+    WHERE n.nspname = ANY(%(schemas)s::name[])
+    GROUP BY t.typname, n.nspname
+    ORDER BY n.nspname, t.typname;
+"""
+
+TABLES_SQL = """
+    SELECT
+        n.nspname as schema_name,
+        t.relname as table_name
+    FROM pg_class t
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    WHERE n.nspname = ANY(%(schemas)s::name[])
+    AND t.relkind IN ('r', 'p')
+    ORDER BY n.nspname, t.relname;
+"""
+
+CHECK_SQL = """
+    SELECT
+        n.nspname as schema_name,
+        t.relname as table_name,
+        c.conname as constraint_name,
+        pg_get_constraintdef(c.oid) as constraint_definition,
+        a.attname as column_name
+    FROM pg_constraint c
+    JOIN pg_namespace n ON n.oid = c.connamespace
+    JOIN pg_class t ON t.oid = c.conrelid
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = ANY(c.conkey)
+    WHERE c.contype = 'c'
+    AND n.nspname = ANY(%(schemas)s::name[]);
+"""
+
+COLUMNS_SQL = """
+    SELECT
+        n.nspname as schema_name,
+        t.relname as table_name,
+        a.attname as column_name,
+        format_type(a.atttypid, a.atttypmod) as data_type,
+        NOT a.attnotnull as is_nullable,
+        pg_get_expr(d.adbin, d.adrelid) as column_default
+    FROM pg_attribute a
+    JOIN pg_class t ON t.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+        AND a.attgenerated = ''
+    WHERE n.nspname = ANY(%(schemas)s::name[])
+    AND t.relkind IN ('r', 'p')
+    AND a.attnum > 0
+    AND NOT a.attisdropped
+    ORDER BY n.nspname, t.relname, a.attnum;
+"""
+
+# Primary key and unique constraints share the same shape
+KEY_SQL = """
+    SELECT
+        n.nspname as schema_name,
+        t.relname as table_name,
+        c.conname as constraint_name,
+        c.contype as constraint_type,
+        array_agg(a.attname ORDER BY k.ord) as column_names
+    FROM pg_constraint c
+    JOIN pg_namespace n ON n.oid = c.connamespace
+    JOIN pg_class t ON t.oid = c.conrelid
+    JOIN unnest(c.conkey) WITH ORDINALITY k(attnum, ord) ON true
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+    WHERE c.contype IN ('p', 'u')
+    AND n.nspname = ANY(%(schemas)s::name[])
+    GROUP BY n.nspname, t.relname, c.conname, c.contype
+    ORDER BY n.nspname, t.relname, c.conname;
+"""
+
+FOREIGN_KEY_SQL = """
+    SELECT
+        n.nspname as schema_name,
+        t.relname as table_name,
+        c.conname as constraint_name,
+        array_agg(a.attname ORDER BY k.ord) as constrained_columns,
+        rn.nspname as referred_schema,
+        rt.relname as referred_table,
+        array_agg(ra.attname ORDER BY k.ord) as referred_columns
+    FROM pg_constraint c
+    JOIN pg_namespace n ON n.oid = c.connamespace
+    JOIN pg_class t ON t.oid = c.conrelid
+    JOIN pg_class rt ON rt.oid = c.confrelid
+    JOIN pg_namespace rn ON rn.oid = rt.relnamespace
+    JOIN unnest(c.conkey, c.confkey) WITH ORDINALITY k(attnum, refnum, ord) ON true
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+    JOIN pg_attribute ra ON ra.attrelid = rt.oid AND ra.attnum = k.refnum
+    WHERE c.contype = 'f'
+    AND n.nspname = ANY(%(schemas)s::name[])
+    GROUP BY n.nspname, t.relname, c.conname, rn.nspname, rt.relname
+    ORDER BY n.nspname, t.relname, c.conname;
+"""
+
+INDEX_SQL = """
+    SELECT
+        n.nspname as schema_name,
+        t.relname as table_name,
+        c.relname as index_name,
+        pg_get_indexdef(i.indexrelid) as index_definition,
+        i.indisunique as is_unique,
+        i.indisprimary as is_primary,
+        array_agg(a.attname ORDER BY k.ord) as column_names
+    FROM pg_index i
+    JOIN pg_class c ON i.indexrelid = c.oid
+    JOIN pg_class t ON i.indrelid = t.oid
+    JOIN pg_namespace n ON t.relnamespace = n.oid
+    JOIN unnest(i.indkey) WITH ORDINALITY k(attnum, ord) ON k.ord <= i.indnkeyatts
+    LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+    WHERE n.nspname = ANY(%(schemas)s::name[])
+    AND t.relkind IN ('r', 'p')
+    GROUP BY n.nspname, t.relname, c.relname, i.indexrelid, i.indisunique, i.indisprimary
+    ORDER BY n.nspname, t.relname, i.indisprimary, c.relname;
+"""
+
+TRIGGER_SQL = """
+    SELECT
+        t.tgname AS trigger_name,
+        n.nspname AS schema_name,
+        c.relname AS table_name,
+        p.proname AS function_name,
+        t.tgtype AS trigger_type,
+        t.tgenabled AS enabled_state
+    FROM pg_trigger t
+    JOIN pg_class c ON t.tgrelid = c.oid
+    JOIN pg_namespace n ON c.relnamespace = n.oid
+    JOIN pg_proc p ON t.tgfoid = p.oid
+    WHERE NOT t.tgisinternal
+    AND n.nspname = ANY(%(schemas)s::name[])
+    AND t.tgname NOT LIKE 'pg_%%'
+    AND t.tgname NOT LIKE 'supabase_%%'
+    ORDER BY n.nspname, c.relname, t.tgname;
+"""
+
+# Aggregates are skipped since pg_get_functiondef() rejects them
+FUNCTION_SQL = """
+    SELECT p.proname AS function_name,
+           n.nspname AS schema_name,
+           pg_get_function_arguments(p.oid) as arguments,
+           pg_get_function_result(p.oid) as return_type,
+           pg_get_functiondef(p.oid) as definition
+    FROM pg_proc p
+    JOIN pg_namespace n ON p.pronamespace = n.oid
+    WHERE n.nspname = ANY(%(schemas)s::name[])
+    AND p.proname NOT LIKE 'pg_%%'
+    AND p.proname NOT LIKE 'supabase_%%'
+    AND p.prokind <> 'a'
+    ORDER BY n.nspname, p.proname;
+"""
+
+def fetch_catalog_fingerprint(connection, schemas):
+    """Hash the catalog rows behind each metadata section.
+
+    Any DDL rewrites the affected catalog rows and so changes their xmin,
+    which makes this a cheap way to tell whether anything the output is built
+    from has changed since the last run.
+    """
+    cursor = connection.execute(FINGERPRINT_SQL, {"schemas": schemas})
+    names = [column.name for column in cursor.description]
+    return dict(zip(names, cursor.fetchone()))
+
+def load_cached_fingerprint():
+    """Return the fingerprint stored by the last run, or None."""
+    try:
+        with open(CACHE_FILE, "rb") as cache_file:
+            return orjson.loads(cache_file.read())
+    except (OSError, ValueError):
+        return None
+
+# Each build_* function turns the pending results of its queries into
+# metadata once the pipeline has synced. Builders iterate their cursors rather
+# than calling fetchall(), which skips building an intermediate list of row
+# tuples. Pipeline results are still held client-side in full, so peak memory
+# is about the same; only that extra list goes away.
+
+def build_enums(cursor):
+    """Build enumerated types and their values."""
+    enums = []
+    for enum_name, schema_name, enum_values in cursor:
+        enums.append({
             "name": enum_name,
             "schema": schema_name,
             "values": enum_values
         })
+    return enums
 
-# Fetch Tables and Columns
-tables = inspector.get_table_names()
-for table in tables:
-    columns = inspector.get_columns(table)
-    pk_constraint = inspector.get_pk_constraint(table)
-    unique_constraints = inspector.get_unique_constraints(table)
-    check_constraints = []
-    
-    # Get check constraints
-    with engine.connect() as connection:
-        check_query = text("""
-            SELECT 
-                c.conname as constraint_name,
-                pg_get_constraintdef(c.oid) as constraint_definition,
-                a.attname as column_name
-            FROM pg_constraint c
-            JOIN pg_namespace n ON n.oid = c.connamespace
-            JOIN pg_class t ON t.oid = c.conrelid
-            JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = ANY(c.conkey)
-            WHERE c.contype = 'c'
-            AND t.relname = :table_name
-            AND n.nspname = 'public';
-        """)
-        result = connection.execute(check_query, {"table_name": table})
-        check_constraints = [{"name": r[0], "definition": r[1], "column": r[2]} for r in result.fetchall()]
-    
-    # Process columns with enhanced information
-    processed_columns = []
-    for col in columns:
-        column_info = {
-            "name": col['name'],
-            "type": str(col['type']),
-            "is_nullable": col.get('nullable', True),
-            "default": col.get('default'),
-            "is_primary_key": col['name'] in pk_constraint.get('constrained_columns', []) if pk_constraint else False,
-            "is_unique": any(col['name'] in uc['column_names'] for uc in unique_constraints),
-            "check_constraints": [c['definition'] for c in check_constraints if c['column'] == col['name']]
-        }
-        processed_columns.append(column_info)
-
-    database_metadata["tables"].append({
-        "table_name": table,
-        "columns": processed_columns
-    })
-
-# Fetch Foreign Keys
-for table in tables:
-    foreign_keys = inspector.get_foreign_keys(table)
-    for fk in foreign_keys:
-        database_metadata["foreign_keys"].append({
-            "table": table,
-            "constrained_columns": fk["constrained_columns"],
-            "referred_table": fk["referred_table"],
-            "referred_columns": fk["referred_columns"]
+def build_tables(tables_cursor, checks_cursor, columns_cursor, keys_cursor):
+    """Build tables with their columns, keys and check constraints."""
+    checks_by_table = defaultdict(list)
+    for (schema_name, table_name, constraint_name,
+         constraint_definition, column_name) in checks_cursor:
+        checks_by_table[schema_name, table_name].append({
+            "name": constraint_name,
+            "definition": constraint_definition,
+            "column": column_name
         })
 
-# Fetch Indexes
-with engine.connect() as connection:
-    for table in tables:
-        indexes = inspector.get_indexes(table)
-        pk_constraint = inspector.get_pk_constraint(table)
-        
-        # Add regular indexes
-        for index in indexes:
-            # Get index definition
-            index_def_query = text("""
-                SELECT pg_get_indexdef(i.indexrelid) as index_definition
-                FROM pg_index i
-                JOIN pg_class c ON i.indexrelid = c.oid
-                WHERE c.relname = :index_name
-            """)
-            result = connection.execute(index_def_query, {"index_name": index["name"]})
-            index_def = result.scalar()
-
-            database_metadata["indexes"].append({
-                "table": table,
-                "index_name": index["name"],
-                "columns": index["column_names"],
-                "unique": index["unique"],
-                "definition": index_def
-            })
-        
-        # Add primary key index if it exists
-        if pk_constraint and pk_constraint.get('name'):
-            # Get primary key index definition
-            pk_def_query = text("""
-                SELECT pg_get_indexdef(i.indexrelid) as index_definition
-                FROM pg_index i
-                JOIN pg_class c ON i.indexrelid = c.oid
-                WHERE c.relname = :index_name
-            """)
-            result = connection.execute(pk_def_query, {"index_name": pk_constraint['name']})
-            pk_def = result.scalar()
-
-            database_metadata["indexes"].append({
-                "table": table,
-                "index_name": pk_constraint['name'],
-                "columns": pk_constraint['constrained_columns'],
-                "unique": True,  # Primary keys are always unique
-                "definition": pk_def
+    cols_by_table = defaultdict(list)
+    for (schema_name, table_name, column_name,
+         data_type, is_nullable, column_default) in columns_cursor:
+        cols_by_table[schema_name, table_name].append({
+            "name": column_name,
+            "type": data_type,
+            "nullable": is_nullable,
+            "default": column_default
+        })
+
+    pk_by_table = {}
+    uniques_by_table = defaultdict(list)
+    for (schema_name, table_name, constraint_name,
+         constraint_type, column_names) in keys_cursor:
+        if constraint_type == 'p':
+            pk_by_table[schema_name, table_name] = {
+                "name": constraint_name,
+                "constrained_columns": column_names
+            }
+        else:
+            uniques_by_table[schema_name, table_name].append({
+                "name": constraint_name,
+                "column_names": column_names
             })
 
-# Fetch Triggers
-with engine.connect() as connection:
-    triggers_query = text("""
-        SELECT 
-            t.tgname AS trigger_name,
-            c.relname AS table_name,
-            p.proname AS function_name,
-            CASE 
-                WHEN t.tgtype & 2 > 0 THEN 'BEFORE'
-                WHEN t.tgtype & 16 > 0 THEN 'AFTER'
-                WHEN t.tgtype & 64 > 0 THEN 'INSTEAD OF'
-            END as timing,
-            CASE
-                WHEN t.tgtype & 4 > 0 THEN true
-                ELSE false
-            END as is_insert,
-            CASE
-                WHEN t.tgtype & 8 > 0 THEN true
-                ELSE false
-            END as is_delete,
-            CASE
-                WHEN t.tgtype & 16 > 0 THEN true
-                ELSE false
-            END as is_update,
-            CASE
-                WHEN t.tgtype & 1 > 0 THEN 'ROW'
-                ELSE 'STATEMENT'
-            END as orientation,
-            t.tgenabled != 'D' as is_enabled
-        FROM pg_trigger t
-        JOIN pg_class c ON t.tgrelid = c.oid
-        JOIN pg_namespace n ON c.relnamespace = n.oid
-        JOIN pg_proc p ON t.tgfoid = p.oid
-        WHERE NOT t.tgisinternal 
-        AND n.nspname = 'public'
-        AND t.tgname NOT LIKE 'pg_%'
-        AND t.tgname NOT LIKE 'supabase_%';
-    """)
-    result = connection.execute(triggers_query)
-    for (trigger_name, table_name, function_name, timing, 
-         is_insert, is_delete, is_update, orientation, 
-         is_enabled) in result.fetchall():
+    # Assemble tables and columns; tables are keyed by (schema, table) so
+    # same-named tables in different schemas stay apart
+    tables_metadata = []
+    for table in tables_cursor:
+        schema_name, table_name = table
+        columns = cols_by_table.get(table, [])
+        pk_constraint = pk_by_table.get(table, {})
+        unique_constraints = uniques_by_table.get(table, [])
+        check_constraints = checks_by_table.get(table, [])
+
+        # Index keys and checks by column once, so each column is an O(1) lookup
+        pk_cols = set(pk_constraint.get('constrained_columns') or ())
+        unique_cols = {c for uc in unique_constraints for c in uc['column_names']}
+        checks_by_col = defaultdict(list)
+        for c in check_constraints:
+            checks_by_col[c['column']].append(c['definition'])
+
+        # Process columns with enhanced information
+        processed_columns = []
+        for col in columns:
+            column_info = {
+                "name": col['name'],
+                "type": col['type'],
+                "is_nullable": col.get('nullable', True),
+                "default": col.get('default'),
+                "is_primary_key": col['name'] in pk_cols,
+                "is_unique": col['name'] in unique_cols,
+                "check_constraints": checks_by_col.get(col['name'], [])
+            }
+            processed_columns.append(column_info)
+
+        tables_metadata.append({
+            "schema": schema_name,
+            "table_name": table_name,
+            "columns": processed_columns
+        })
+    return tables_metadata
+
+def build_foreign_keys(cursor):
+    """Build foreign key relationships between tables."""
+    foreign_keys = []
+    for (schema_name, table_name, constraint_name, constrained_columns,
+         referred_schema, referred_table, referred_columns) in cursor:
+        foreign_keys.append({
+            "schema": schema_name,
+            "table": table_name,
+            "constrained_columns": constrained_columns,
+            "referred_schema": referred_schema,
+            "referred_table": referred_table,
+            "referred_columns": referred_columns
+        })
+    return foreign_keys
+
+def build_indexes(cursor):
+    """Build indexes, including primary key indexes."""
+    indexes = []
+    for (schema_name, table_name, index_name, index_def, is_unique,
+         is_primary, column_names) in cursor:
+        indexes.append({
+            "schema": schema_name,
+            "table": table_name,
+            "index_name": index_name,
+            "columns": column_names,
+            "unique": is_unique or is_primary,  # Primary keys are always unique
+            "definition": index_def
+        })
+    return indexes
+
+# Bits of pg_trigger.tgtype, as defined in PostgreSQL's catalog/pg_trigger.h
+TRIGGER_TYPE_ROW = 1 << 0
+TRIGGER_TYPE_BEFORE = 1 << 1
+TRIGGER_TYPE_INSERT = 1 << 2
+TRIGGER_TYPE_DELETE = 1 << 3
+TRIGGER_TYPE_UPDATE = 1 << 4
+TRIGGER_TYPE_INSTEAD = 1 << 6
+
+def build_triggers(cursor):
+    """Build user-defined triggers, decoding the tgtype bitmask."""
+    triggers = []
+    for (trigger_name, schema_name, table_name, function_name,
+         trigger_type, enabled_state) in cursor:
+        # Neither BEFORE nor INSTEAD OF set means an AFTER trigger
+        if trigger_type & TRIGGER_TYPE_BEFORE:
+            timing = "BEFORE"
+        elif trigger_type & TRIGGER_TYPE_INSTEAD:
+            timing = "INSTEAD OF"
+        else:
+            timing = "AFTER"
+
         # Build events list
         events = []
-        if is_insert:
+        if trigger_type & TRIGGER_TYPE_INSERT:
             events.append(f"{timing} INSERT")
-        if is_delete:
+        if trigger_type & TRIGGER_TYPE_DELETE:
             events.append(f"{timing} DELETE")
-        if is_update:
+        if trigger_type & TRIGGER_TYPE_UPDATE:
             events.append(f"{timing} UPDATE")
-            
-        database_metadata["triggers"].append({
+
+        triggers.append({
             "trigger_name": trigger_name,
+            "schema": schema_name,
             "table": table_name,
             "function": function_name,
             "events": events,
-            "orientation": orientation,
-            "enabled": is_enabled
+            "orientation": "ROW" if trigger_type & TRIGGER_TYPE_ROW else "STATEMENT",
+            "enabled": enabled_state != 'D'
         })
+    return triggers
 
-# Fetch Functions
-with engine.connect() as connection:
-    functions_query = text("""
-        SELECT p.proname AS function_name, 
-               n.nspname AS schema_name,
-               pg_get_function_arguments(p.oid) as arguments,
-               pg_get_function_result(p.oid) as return_type,
-               pg_get_functiondef(p.oid) as definition
-        FROM pg_proc p
-        JOIN pg_namespace n ON p.pronamespace = n.oid
-        WHERE n.nspname = 'public'
-        AND p.proname NOT LIKE 'pg_%'
-        AND p.proname NOT LIKE 'supabase_%'
-        ORDER BY p.proname;
-    """)
-    result = connection.execute(functions_query)
-    for function_name, schema_name, arguments, return_type, definition in result.fetchall():
-        database_metadata["functions"].append({
+def build_functions(cursor):
+    """Build user-defined functions and their definitions."""
+    functions = []
+    for function_name, schema_name, arguments, return_type, definition in cursor:
+        functions.append({
             "function_name": function_name,
             "schema": schema_name,
             "arguments": arguments,
             "return_type": return_type,
             "definition": definition
         })
+    return functions
+
+def extract_metadata(connection, schemas):
+    """Extract the full database metadata over a single pipelined connection."""
+    # Send every catalog query in a single pipeline so they share one network
+    # flight, then build the metadata once all results have arrived. The
+    # queries stay separate statements rather than one ';'-joined string:
+    # psycopg can't run multi-statement strings in pipeline mode, and the
+    # pipeline already sends them all before reading any result back.
+    params = {"schemas": schemas}
+    with connection.pipeline():
+        table_cursors = [
+            connection.execute(query, params)
+            for query in (TABLES_SQL, CHECK_SQL, COLUMNS_SQL, KEY_SQL)
+        ]
+        fk_cursor = connection.execute(FOREIGN_KEY_SQL, params)
+        function_cursor = connection.execute(FUNCTION_SQL, params)
+        trigger_cursor = connection.execute(TRIGGER_SQL, params)
+        enum_cursor = connection.execute(ENUM_SQL, params)
+        index_cursor = connection.execute(INDEX_SQL, params)
+
+    return {
+        "tables": build_tables(*table_cursors),
+        "foreign_keys": build_foreign_keys(fk_cursor),
+        "functions": build_functions(function_cursor),
+        "triggers": build_triggers(trigger_cursor),
+        "enums": build_enums(enum_cursor),
+        "indexes": build_indexes(index_cursor)
+    }
+
+# Markdown is rendered one section per function so the sections can be built
+# in parallel worker processes; each takes that section's metadata list. The
+# section templates are compiled once, when the module is imported.
+
+MARKDOWN_HEADER = "# Database Schema Documentation\n\n"
+
+markdown_env = Environment(
+    autoescape=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=True
+)
+
+# Templates use subscripts rather than attribute access so that keys such as
+# enum['values'] aren't shadowed by dict methods of the same name
+TABLES_TEMPLATE = markdown_env.from_string("""\
+## Tables
+
+{% for table in tables %}
+### {{ table['schema'] }}.{{ table['table_name'] }}
+
+| Column | Type | Nullable | Default | Primary Key | Unique | Constraints |
+|--------|------|----------|----------|-------------|---------|-------------|
+{% for col in table['columns'] %}
+| {{ col['name'] }} | {{ col['type'] }} | {{ col['is_nullable'] }} | {{ col['default'] or '-' }} | {{ col['is_primary_key'] }} | {{ col['is_unique'] }} | {{ col['check_constraints'] | join(', ') or '-' }} |
+{% endfor %}
+
+{% endfor %}
+""")
+
+FOREIGN_KEYS_TEMPLATE = markdown_env.from_string("""\
+## Foreign Key Relationships
+
+{% for fk in foreign_keys %}
+- `{{ fk['schema'] }}.{{ fk['table'] }}.{{ fk['constrained_columns'] | join(', ') }}` → `{{ fk['referred_schema'] }}.{{ fk['referred_table'] }}.{{ fk['referred_columns'] | join(', ') }}`
+{% endfor %}
+
+""")
+
+FUNCTIONS_TEMPLATE = markdown_env.from_string("""\
+## Database Functions
+
+{% for func in functions %}
+### {{ func['function_name'] }}
+```yaml
+Schema: {{ func['schema'] }}
+Arguments: {{ func['arguments'] }}
+Returns: {{ func['return_type'] }}
+```
+Definition:
+```sql
+{{ func['definition'] }}
+```
+
+{% endfor %}
+""")
+
+TRIGGERS_TEMPLATE = markdown_env.from_string("""\
+## Triggers
+
+{% for trigger in triggers %}
+### {{ trigger['trigger_name'] }}
+```yaml
+Table: {{ trigger['schema'] }}.{{ trigger['table'] }}
+Function: {{ trigger['function'] }}
+Events: {{ trigger['events'] | join(', ') }}
+Orientation: {{ trigger['orientation'] }}
+Enabled: {{ trigger['enabled'] }}
+```
+
+{% endfor %}
+""")
+
+ENUMS_TEMPLATE = markdown_env.from_string("""\
+## Enumerated Types
+
+{% for enum in enums %}
+### {{ enum['name'] }}
+- Schema: `{{ enum['schema'] }}`
+- Values: `{{ enum['values'] | join(', ') }}`
+
+{% endfor %}
+""")
+
+INDEXES_TEMPLATE = markdown_env.from_string("""\
+## Indexes
+
+{% for idx in indexes %}
+{% set columns = idx['columns'] | reject('none') | join(', ') %}
+### {{ idx['index_name'] }}
+- Table: `{{ idx['schema'] }}.{{ idx['table'] }}`
+- Columns: `{{ columns or 'N/A' }}`
+- Unique: `{{ idx['unique'] }}`
+{% if idx['definition'] %}
+```sql
+{{ idx['definition'] }}
+```
+{% endif %}
+
+{% endfor %}
+""")
+
+def render_tables(tables):
+    """Render the tables section."""
+    return TABLES_TEMPLATE.render(tables=tables)
+
+def render_foreign_keys(foreign_keys):
+    """Render the foreign key relationships section."""
+    return FOREIGN_KEYS_TEMPLATE.render(foreign_keys=foreign_keys)
+
+def render_functions(functions):
+    """Render the database functions section."""
+    return FUNCTIONS_TEMPLATE.render(functions=functions)
+
+def render_triggers(triggers):
+    """Render the triggers section."""
+    return TRIGGERS_TEMPLATE.render(triggers=triggers)
+
+def render_enums(enums):
+    """Render the enumerated types section."""
+    return ENUMS_TEMPLATE.render(enums=enums)
+
+def render_indexes(indexes):
+    """Render the indexes section."""
+    return INDEXES_TEMPLATE.render(indexes=indexes)
+
+# Sections in the order they appear in the markdown document
+MARKDOWN_SECTIONS = (
+    ("tables", render_tables),
+    ("foreign_keys", render_foreign_keys),
+    ("functions", render_functions),
+    ("triggers", render_triggers),
+    ("enums", render_enums),
+    ("indexes", render_indexes)
+)
 
 def convert_to_markdown(database_metadata):
     """Convert the database metadata to markdown format."""
-    md = ["# Database Schema Documentation\n\n"]
-    
-    # Tables
-    md.append("## Tables\n\n")
-    for table in database_metadata["tables"]:
-        md.append(f"### {table['table_name']}\n\n")
-        md.append("| Column | Type | Nullable | Default | Primary Key | Unique | Constraints |\n")
-        md.append("|--------|------|----------|----------|-------------|---------|-------------|\n")
-        for col in table["columns"]:
-            constraints = ", ".join(col["check_constraints"]) if col["check_constraints"] else "-"
-            md.append(f"| {col['name']} | {col['type']} | {col['is_nullable']} | {col['default'] or '-'} | {col['is_primary_key']} | {col['is_unique']} | {constraints} |\n")
-        md.append("\n")
-    
-    # Foreign Keys
-    md.append("## Foreign Key Relationships\n\n")
-    for fk in database_metadata["foreign_keys"]:
-        md.append(f"- `{fk['table']}.{', '.join(fk['constrained_columns'])}` → ")
-        md.append(f"`{fk['referred_table']}.{', '.join(fk['referred_columns'])}`\n")
-    md.append("\n")
-    
-    # Functions
-    md.append("## Database Functions\n\n")
-    for func in database_metadata["functions"]:
-        md.append(f"### {func['function_name']}\n")
-        md.append("```yaml\n")
-        md.append(f"Schema: {func['schema']}\n")
-        md.append(f"Arguments: {func['arguments']}\n")
-        md.append(f"Returns: {func['return_type']}\n")
-        md.append("```\n")
-        md.append("Definition:\n")
-        md.append("```sql\n" + func['definition'] + "\n```\n\n")
-    
-    # Triggers
-    md.append("## Triggers\n\n")
-    for trigger in database_metadata["triggers"]:
-        md.append(f"### {trigger['trigger_name']}\n")
-        md.append("```yaml\n")
-        md.append(f"Table: {trigger['table']}\n")
-        md.append(f"Function: {trigger['function']}\n")
-        md.append(f"Events: {', '.join(trigger['events'])}\n")
-        md.append(f"Orientation: {trigger['orientation']}\n")
-        md.append(f"Enabled: {trigger['enabled']}\n")
-        md.append("```\n\n")
-    
-    # Enums
-    md.append("## Enumerated Types\n\n")
-    for enum in database_metadata["enums"]:
-        md.append(f"### {enum['name']}\n")
-        md.append(f"- Schema: `{enum['schema']}`\n")
-        md.append(f"- Values: `{', '.join(enum['values'])}`\n\n")
-    
-    # Indexes
-    md.append("## Indexes\n\n")
-    for idx in database_metadata["indexes"]:
-        md.append(f"### {idx['index_name']}\n")
-        md.append(f"- Table: `{idx['table']}`\n")
-        columns = [str(col) for col in idx['columns'] if col is not None]
-        md.append(f"- Columns: `{', '.join(columns) if columns else 'N/A'}`\n")
-        md.append(f"- Unique: `{idx['unique']}`\n")
-        if idx['definition']:
-            md.append("```sql\n" + idx['definition'] + "\n```\n")
-        md.append("\n")
-    
-    return "".join(md)
-
-# Export metadata to JSON
-with open("database_metadata.json", "w", encoding="utf-8") as json_file:
-    json.dump(database_metadata, json_file, indent=4)
-
-# Generate markdown version
-markdown_content = convert_to_markdown(database_metadata)
-with open("database_schema.md", "w", encoding="utf-8") as md_file:
-    md_file.write(markdown_content)
-
-print("Database metadata exported to 'database_metadata.json' and 'database_schema.md'")
+    return MARKDOWN_HEADER + "".join(
+        render(database_metadata[key]) for key, render in MARKDOWN_SECTIONS
+    )
+
+def write_json(database_metadata, pretty):
+    """Export metadata to JSON, compact unless pretty is set."""
+    json_option = orjson.OPT_INDENT_2 if pretty else None
+    with open("database_metadata.json", "wb") as json_file:
+        json_file.write(orjson.dumps(database_metadata, option=json_option))
+
+def write_markdown(markdown_content):
+    """Write the rendered markdown document."""
+    with open("database_schema.md", "w", encoding="utf-8") as md_file:
+        md_file.write(markdown_content)
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Export the Supabase database schema to JSON and markdown."
+    )
+    json_format = parser.add_mutually_exclusive_group()
+    json_format.add_argument("--compact", dest="pretty", action="store_false",
+                             help="write compact JSON (default)")
+    json_format.add_argument("--pretty", dest="pretty", action="store_true",
+                             help="write indented, human-readable JSON")
+    parser.set_defaults(pretty=False)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # Load environment variables from .env.local
+    load_dotenv('.env')
+
+    # Fail fast with a clear message instead of a TypeError from quote_plus
+    required = ['DB_PASSWORD', 'DB_HOST', 'DB_PORT', 'DB_USER', 'DB_NAME']
+    missing = [name for name in required if not os.getenv(name)]
+    if missing:
+        print(f"Missing environment variables: {', '.join(missing)}", file=sys.stderr)
+        sys.exit(2)
+
+    # Get database credentials from environment variables
+    db_password = quote_plus(os.getenv('DB_PASSWORD'))
+    db_host = os.getenv('DB_HOST')
+    db_port = os.getenv('DB_PORT')
+    db_user = os.getenv('DB_USER')
+    db_name = os.getenv('DB_NAME')
+
+    # Schemas to document, comma-separated; all are extracted in one pass
+    schemas = [schema.strip() for schema in os.getenv('DB_SCHEMAS', 'public').split(',') if schema.strip()]
+    if not schemas:
+        print("DB_SCHEMAS must list at least one schema", file=sys.stderr)
+        sys.exit(2)
+
+    # Construct database URL (psycopg 3 driver, needed for pipeline mode)
+    database_url = f"postgresql+psycopg://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+    # Create an SQLAlchemy engine; the whole run uses a single connection, so
+    # there is no point keeping more than one in the pool or pinging it
+    engine = create_engine(database_url, pool_size=1, max_overflow=0, pool_pre_ping=False)
+
+    # Check the fingerprint and extract on the same long-lived connection
+    raw_connection = engine.raw_connection()
+    try:
+        connection = raw_connection.driver_connection
+
+        # Skip the extraction entirely if nothing changed since the last run;
+        # the schema list, JSON format and output format version are part of
+        # the key so changing any of them forces a rewrite
+        catalog_fingerprint = fetch_catalog_fingerprint(connection, schemas)
+        catalog_fingerprint["schemas"] = schemas
+        catalog_fingerprint["pretty_json"] = args.pretty
+        catalog_fingerprint["format_version"] = OUTPUT_FORMAT_VERSION
+        if (catalog_fingerprint == load_cached_fingerprint()
+                and all(os.path.exists(path) for path in OUTPUT_FILES)):
+            print("Database schema unchanged since last run, skipping extraction")
+            return
+
+        database_metadata = extract_metadata(connection, schemas)
+    finally:
+        raw_connection.close()
+
+    # Render the markdown sections in worker processes while the JSON export
+    # is written on a background thread, then write the stitched-together
+    # markdown on a second thread so the two file writes overlap
+    with ProcessPoolExecutor(max_workers=len(MARKDOWN_SECTIONS)) as render_pool, \
+            ThreadPoolExecutor(max_workers=2) as write_pool:
+        section_futures = [
+            render_pool.submit(render, database_metadata[key])
+            for key, render in MARKDOWN_SECTIONS
+        ]
+        json_future = write_pool.submit(write_json, database_metadata, args.pretty)
+
+        # Generate markdown version
+        markdown_content = MARKDOWN_HEADER + "".join(
+            future.result() for future in section_futures
+        )
+        md_future = write_pool.submit(write_markdown, markdown_content)
+
+        json_future.result()
+        md_future.result()
+
+    # Remember the catalog state these outputs were generated from
+    with open(CACHE_FILE, "wb") as cache_file:
+        cache_file.write(orjson.dumps(catalog_fingerprint, option=orjson.OPT_INDENT_2))
+
+    print("Database metadata exported to 'database_metadata.json' and 'database_schema.md'")
+
+if __name__ == "__main__":
+    main()